@@ -1,6 +1,13 @@
 import os
-import uuid
-from typing import Optional, List, Dict, Any
+import re
+import secrets
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional, List, Dict, Any, BinaryIO
 
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
@@ -10,6 +17,11 @@ from database import db
 from datetime import datetime, timezone
 
 # PDF/DOCX text extraction helpers
+try:
+    import fitz  # PyMuPDF
+except Exception:
+    fitz = None
+
 try:
     from PyPDF2 import PdfReader
 except Exception:
@@ -21,6 +33,44 @@ except Exception:
     docx = None
 
 from bson import ObjectId
+from pymongo import ReturnDocument, WriteConcern
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL_SECONDS = 86400 * 30
+
+# (collection, keys, create_index options) ensured at startup
+_INDEXES = [
+    ("user", "email", {"unique": True}),
+    ("session", "token", {"unique": True}),
+    ("session", "created_at", {"expireAfterSeconds": SESSION_TTL_SECONDS}),
+    ("profile", "share_slug", {"unique": True}),
+]
+
+_WORD_RE = re.compile(r"[A-Za-z]{4,}")
+
+# combined input size above which /generate results are not cached, keeping
+# the cache at most a few MB however large the request bodies are
+_GENERATE_CACHE_MAX_CHARS = 16_384
+
+# static parts of every generated profile
+_HEADER = "Impact-forward Resume"
+_FOOTER = "Created with Flames Blue Resume Builder"
+_ADVICE = (
+    "Record a 60–90s Loom: start with a 10s intro (name, role), then 30s on a signature achievement, 20s on how it maps to the JD, "
+    "and finish with a clear ask to connect. Smile, good lighting, and share 1 on-screen artifact (dashboard, code snippet, design)."
+)
+
+# fields returned by GET /profile/{slug}
+_PROFILE_FIELDS = {
+    "user_id": 1,
+    "content": 1,
+    "loom_url": 1,
+    "photo_url": 1,
+    "share_slug": 1,
+    "created_at": 1,
+    "updated_at": 1,
+}
 
 
 class SignInRequest(BaseModel):
@@ -56,14 +106,36 @@ class SaveProfileResponse(BaseModel):
     share_slug: str
 
 
-app = FastAPI()
+def ensure_indexes():
+    # Each index is attempted on its own so one failure (e.g. duplicate emails
+    # left behind by older signins) doesn't stop the others from being built
+    for collection, keys, options in _INDEXES:
+        try:
+            db[collection].create_index(keys, **options)
+        except Exception as e:
+            logger.warning("Could not create index %s on %s: %s", keys, collection, str(e)[:200])
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build indexes in the background so an unreachable database cannot block
+    # startup; routes that don't touch the DB keep serving either way
+    if db is not None:
+        threading.Thread(target=ensure_indexes, name="ensure-indexes", daemon=True).start()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Comma-separated list of frontend origins, e.g. "https://app.example.com,http://localhost:3000"
+cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=cors_origins or ["*"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["Authorization", "Content-Type"],
 )
 
 
@@ -77,65 +149,75 @@ def signin(payload: SignInRequest):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
 
-    # upsert user by email
-    user = db["user"].find_one({"email": payload.email})
-    if not user:
-        user_doc = {
-            "email": payload.email,
-            "name": payload.name or payload.email.split("@")[0],
-            "created_at": datetime.now(timezone.utc),
-            "updated_at": datetime.now(timezone.utc),
-        }
-        res = db["user"].insert_one(user_doc)
-        user_id = str(res.inserted_id)
+    now = datetime.now(timezone.utc)
+
+    # upsert user by email in a single round-trip; an existing name is kept
+    # unless a new one is supplied
+    set_fields = {"updated_at": now}
+    on_insert = {"email": payload.email, "created_at": now}
+    if payload.name:
+        set_fields["name"] = payload.name
     else:
-        user_id = str(user["_id"])
-        db["user"].update_one({"_id": ObjectId(user_id)}, {"$set": {"name": payload.name or user.get("name"), "updated_at": datetime.now(timezone.utc)}})
+        on_insert["name"] = payload.email.split("@")[0]
+    user = db["user"].find_one_and_update(
+        {"email": payload.email},
+        {"$set": set_fields, "$setOnInsert": on_insert},
+        projection={"_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    user_id = str(user["_id"])
 
-    token = str(uuid.uuid4())
-    db["session"].insert_one({
+    token = secrets.token_urlsafe(24)
+    # fire-and-forget: nothing on the login path reads the session back
+    db["session"].with_options(write_concern=WriteConcern(w=0)).insert_one({
         "user_id": ObjectId(user_id),
         "token": token,
-        "created_at": datetime.now(timezone.utc)
+        "created_at": now
     })
     return {"user_id": user_id, "token": token}
 
 
+def _safe_page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+
+def _extract_sync(fp: BinaryIO, ext: str) -> str:
+    # CPU-bound parsing; run off the event loop via asyncio.to_thread
+    if ext == "pdf" and fitz:
+        doc = fitz.open(stream=fp.read(), filetype="pdf")
+        try:
+            return "\n".join(page.get_text() for page in doc).strip()
+        finally:
+            doc.close()
+    if ext == "pdf":
+        if not PdfReader:
+            raise HTTPException(status_code=400, detail="PDF support not available")
+        reader = PdfReader(fp)
+        return "\n".join(_safe_page_text(page) for page in reader.pages).strip()
+    if ext in ("docx", "doc"):
+        if not docx:
+            raise HTTPException(status_code=400, detail="DOCX support not available")
+        document = docx.Document(fp)
+        paragraphs = [p.text for p in document.paragraphs]
+        return "\n".join(paragraphs).strip()
+    # treat as text
+    return fp.read().decode("utf-8", errors="ignore")
+
+
 @app.post("/upload/extract-text")
-def extract_text(file: UploadFile = File(...)):
+async def extract_text(file: UploadFile = File(...)):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
 
     filename = file.filename or ""
     ext = filename.split(".")[-1].lower()
-    content = ""
 
     try:
-        if ext == "pdf":
-            if not PdfReader:
-                raise HTTPException(status_code=400, detail="PDF support not available")
-            import io
-            reader = PdfReader(io.BytesIO(file.file.read()))
-            texts = []
-            for page in reader.pages:
-                try:
-                    texts.append(page.extract_text() or "")
-                except Exception:
-                    continue
-            content = "\n".join(texts).strip()
-        elif ext in ("docx", "doc"):
-            if not docx:
-                raise HTTPException(status_code=400, detail="DOCX support not available")
-            import tempfile
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-                tmp.write(file.file.read())
-                tmp.flush()
-                document = docx.Document(tmp.name)
-            paragraphs = [p.text for p in document.paragraphs]
-            content = "\n".join(paragraphs).strip()
-        else:
-            # treat as text
-            content = file.file.read().decode("utf-8", errors="ignore")
+        content = await asyncio.to_thread(_extract_sync, file.file, ext)
     except HTTPException:
         raise
     except Exception as e:
@@ -144,75 +226,81 @@ def extract_text(file: UploadFile = File(...)):
     return {"text": content}
 
 
-def simple_ai_generate(job_description: str, user_material: str) -> GeneratedContent:
+def _build_generated(job_description: str, user_material: str) -> GeneratedContent:
     # Heuristic generation without external AI dependencies
-    jd_lines = [l.strip() for l in job_description.splitlines() if l.strip()]
-    um_lines = [l.strip() for l in user_material.splitlines() if l.strip()]
+    jd_lines = [s for l in job_description.splitlines() if (s := l.strip())]
+    um_lines = [s for l in user_material.splitlines() if (s := l.strip())]
 
     # Extract likely title
     title = " ".join(jd_lines[0].split()[:6]) if jd_lines else "Professional Profile"
 
     # Build summary focusing on overlap keywords (simple heuristic)
     def keywords(text: str) -> List[str]:
-        import re
-        words = re.findall(r"[A-Za-z]{4,}", text.lower())
-        common = {}
-        for w in words:
-            common[w] = common.get(w, 0) + 1
+        words = Counter(m.group().lower() for m in _WORD_RE.finditer(text))
         # top 10
-        return [w for w, _ in sorted(common.items(), key=lambda x: x[1], reverse=True)[:10]]
+        return [w for w, _ in words.most_common(10)]
 
-    jd_kw = set(keywords(job_description))
-    um_kw = set(keywords(user_material))
-    overlap = [w for w in jd_kw.intersection(um_kw)]
+    # keyword lists are ordered by frequency; overlap keeps the JD ordering
+    jd_kw = keywords(job_description)
+    um_kw = keywords(user_material)
+    um_kw_set = set(um_kw)
+    overlap = [w for w in jd_kw if w in um_kw_set]
+    overlap6 = ", ".join(overlap[:6])
 
     summary = (
-        f"Results-driven professional aligning closely with the role's priorities: {', '.join(overlap[:6])}. "
+        f"Results-driven professional aligning closely with the role's priorities: {overlap6}. "
         f"Brings proven experience highlighted below and tailored precisely to the job description."
     )
 
     # Bullets crafted from user material lines containing keywords
     bullets: List[str] = []
-    for line in um_lines[:12]:
-        for k in list(jd_kw)[:8]:
-            if k in line.lower() and len(bullets) < 8:
-                bullets.append(f"Delivered {k}-focused outcomes: {line[:140]}")
-                break
+    if jd_kw:
+        # one alternation scan per line instead of a substring test per keyword
+        kw_search = re.compile("|".join(map(re.escape, jd_kw[:8])), re.IGNORECASE).search
+        for line in um_lines[:12]:
+            hit = kw_search(line)
+            if hit:
+                bullets.append(f"Delivered {hit.group().lower()}-focused outcomes: {line[:140]}")
+                if len(bullets) == 8:
+                    break
     if not bullets:
-        bullets = [f"Accomplished key outcomes across {', '.join(list(um_kw)[:5])}."]
+        bullets = [f"Accomplished key outcomes across {', '.join(um_kw[:5])}."]
 
     cover_letter = (
         "Dear Hiring Manager,\n\n"
         "I'm excited to apply for this opportunity. After reviewing the job description, I curated the attached resume to emphasize the most relevant "
-        "skills and outcomes, including " + ", ".join(list(overlap)[:6]) + ". "
+        f"skills and outcomes, including {overlap6}. "
         "I thrive in collaborative, fast-moving environments and would welcome the chance to contribute.\n\n"
         "Sincerely,\nYour Name"
     )
 
-    header = "Impact-forward Resume"
-    footer = "Created with Flames Blue Resume Builder"
-
-    advice = (
-        "Record a 60–90s Loom: start with a 10s intro (name, role), then 30s on a signature achievement, 20s on how it maps to the JD, "
-        "and finish with a clear ask to connect. Smile, good lighting, and share 1 on-screen artifact (dashboard, code snippet, design)."
-    )
-
     return GeneratedContent(
         title=title,
         summary=summary,
         bullets=bullets,
         cover_letter=cover_letter,
-        header=header,
-        footer=footer,
-        advice=advice,
+        header=_HEADER,
+        footer=_FOOTER,
+        advice=_ADVICE,
     )
 
 
+# Retries and previews resubmit identical inputs, so small inputs are memoized
+_build_generated_cached = lru_cache(maxsize=512)(_build_generated)
+
+
+def simple_ai_generate(job_description: str, user_material: str) -> GeneratedContent:
+    if len(job_description) + len(user_material) > _GENERATE_CACHE_MAX_CHARS:
+        return _build_generated(job_description, user_material)
+    # hand out a copy so callers can never mutate the cached instance
+    return _build_generated_cached(job_description, user_material).model_copy(deep=True)
+
+
 @app.post("/generate", response_model=GeneratedContent)
-def generate(payload: GenerateRequest):
+async def generate(payload: GenerateRequest):
     if not payload.job_description.strip() or not payload.user_material.strip():
         raise HTTPException(status_code=400, detail="Both job description and user material are required")
-    return simple_ai_generate(payload.job_description, payload.user_material)
+    return await asyncio.to_thread(simple_ai_generate, payload.job_description, payload.user_material)
 
 
 @app.post("/profile", response_model=SaveProfileResponse)
@@ -225,7 +313,8 @@ def save_profile(payload: SaveProfileRequest):
     except Exception:
         raise HTTPException(status_code=400, detail="Invalid user_id")
 
-    share_slug = uuid.uuid4().hex[:10]
+    now = datetime.now(timezone.utc)
+    share_slug = secrets.token_urlsafe(8)
 
     doc = {
         "user_id": user_oid,
@@ -233,8 +322,8 @@ def save_profile(payload: SaveProfileRequest):
         "loom_url": payload.loom_url,
         "photo_url": payload.photo_url,
         "share_slug": share_slug,
-        "created_at": datetime.now(timezone.utc),
-        "updated_at": datetime.now(timezone.utc),
+        "created_at": now,
+        "updated_at": now,
     }
 
     res = db["profile"].insert_one(doc)
@@ -245,13 +334,13 @@ def save_profile(payload: SaveProfileRequest):
 def get_profile(slug: str):
     if db is None:
         raise HTTPException(status_code=500, detail="Database not configured")
-    doc = db["profile"].find_one({"share_slug": slug})
+    doc = db["profile"].find_one({"share_slug": slug}, _PROFILE_FIELDS)
     if not doc:
         raise HTTPException(status_code=404, detail="Profile not found")
 
     # transform ObjectId
     doc["_id"] = str(doc["_id"])
-    doc["user_id"] = str(doc["user_id"]) if isinstance(doc["user_id"], ObjectId) else doc["user_id"]
+    doc["user_id"] = str(doc["user_id"])
     return doc
 
 